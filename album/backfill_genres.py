@@ -0,0 +1,92 @@
+"""
+One-off backfill of the normalized genres of albums stored before the genres table existed.
+
+    python -m album.backfill_genres
+
+Albums only kept Discogs' genres joined with ", " in albums.genre. Some Discogs genres contain ", "
+themselves ("Folk, World, & Country"), so the string is split against Discogs' fixed genre list first;
+any other part (styles, used when a release has no genres) is taken as is. Albums that already have
+genres are skipped, so the script is safe to re-run.
+"""
+from sqlalchemy import select, exists
+from database.core import SessionLocal
+from entities.album import Album
+from entities.genre import album_genres
+from .service import link_album_genres
+import argparse
+import logging
+
+DISCOGS_GENRES = [
+    'Blues', 'Brass & Military', "Children's", 'Classical', 'Electronic', 'Folk, World, & Country',
+    'Funk / Soul', 'Hip Hop', 'Jazz', 'Latin', 'Non-Music', 'Pop', 'Reggae', 'Rock', 'Stage & Screen',
+]
+# Genres spanning several ", " separated parts, longest first
+_MULTI_PART_GENRES = sorted(
+    (genre.split(', ') for genre in DISCOGS_GENRES if ', ' in genre), key=len, reverse=True)
+
+
+def split_genres(genre: str | None) -> list[str]:
+    ''' Split a comma-joined albums.genre back into the genre names it was built from '''
+    if not genre:
+        return []
+
+    parts = genre.split(', ')
+    names = []
+    i = 0
+    while i < len(parts):
+        for genre_parts in _MULTI_PART_GENRES:
+            if parts[i:i + len(genre_parts)] == genre_parts:
+                names.append(', '.join(genre_parts))
+                i += len(genre_parts)
+                break
+        else:
+            names.append(parts[i])
+            i += 1
+    return [name for name in names if name.strip() and name != 'Unknown']
+
+
+def backfill(batch_size: int) -> int:
+    ''' Link genres for every album without any, one transaction per batch; returns the albums linked '''
+    linked = 0
+    last_id = 0
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(Album.id, Album.genre)
+                .where(Album.id > last_id)
+                .where(~exists().where(album_genres.c.album_id == Album.id))
+                .order_by(Album.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return linked
+
+            for row in rows:
+                names = split_genres(row.genre)
+                if names:
+                    link_album_genres(row.id, names, db)
+                    linked += 1
+            db.commit()
+
+        last_id = rows[-1].id
+        logging.info(f'Backfilled genres up to album: {last_id}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Fill the genres and album_genres tables from albums.genre')
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='albums linked per transaction')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.batch_size < 1:
+        parser.error('--batch-size must be at least 1')
+
+    linked = backfill(args.batch_size)
+    logging.info(f'Linked genres for {linked} albums')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,13 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
 from database.core import DbSession
 from rate_limiting import limiter
 from starlette import status
 from . import service
 from . import model
+from . import feed
+from . import covers
 from auth.service import CurrentUser
 
 
@@ -22,7 +25,7 @@ async def get_ratings(request: Request, db_session: DbSession, current_user: Cur
 
 @router.post('/rate-album', status_code=status.HTTP_201_CREATED)
 @limiter.limit("5/minute")
-async def rate_album(request: Request, rating: model.RatingCreateRequest, db_session: DbSession, current_user: CurrentUser):
+def rate_album(request: Request, rating: model.RatingCreateRequest, db_session: DbSession, current_user: CurrentUser):
     return service.rate_album(rating, db_session, current_user)
 
 
@@ -42,3 +45,41 @@ async def delete_all_ratings(request: Request, db_session: DbSession, current_us
 @limiter.limit("5/minute")
 async def change_rating(request: Request, new_rating: model.RatingUpdateRequest, db_session: DbSession, current_user: CurrentUser):
     return service.change_rating(new_rating, db_session, current_user)
+
+
+@router.post('/resolve', response_model=List[model.AlbumResolveResponse])
+@limiter.limit("5/minute")
+def resolve_albums(request: Request, resolve_request: model.AlbumResolveRequest, db_session: DbSession, current_user: CurrentUser):
+    return service.resolve_albums(resolve_request, db_session)
+
+
+@router.get('/feed', response_model=model.FeedResponse)
+@limiter.limit("60/minute")
+async def get_feed(request: Request, current_user: CurrentUser,
+                   after: int = Query(0, ge=0),
+                   limit: int = Query(50, ge=1, le=feed.FEED_CAPACITY),
+                   wait: float = Query(0, ge=0, le=feed.FEED_MAX_WAIT_SECONDS)):
+    # Served from the in-memory buffer only; with wait > 0 the request long-polls for new events
+    events, cursor = await feed.feed.wait_for(after, limit, wait)
+    return model.FeedResponse(events=events, cursor=cursor)
+
+
+@router.get('/{album_id}/cover')
+@limiter.limit("120/minute")
+def get_cover(request: Request, album_id: int, db_session: DbSession, size: str = Query(covers.ORIGINAL)):
+    cover = service.get_cover(album_id, size, db_session)
+
+    # Still being fetched: send the client to the remote image meanwhile
+    if isinstance(cover, str):
+        return RedirectResponse(cover, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers={'Cache-Control': 'no-store'})
+
+    path, content_type, etag = cover
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={covers.COVER_MAX_AGE_SECONDS}'
+    }
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Sent with the server's zero-copy path (pathsend) when the ASGI server supports it
+    return FileResponse(path, media_type=content_type, headers=headers)
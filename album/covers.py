@@ -0,0 +1,269 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from threading import Lock
+from urllib.parse import urlparse
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database.core import SessionLocal, upsert
+from entities.album import AlbumCover
+import hashlib
+import logging
+import mimetypes
+import requests
+import tempfile
+import time
+import dotenv
+import os
+
+dotenv.load_dotenv()
+COVER_STORE_DIR = os.getenv("COVER_STORE_DIR", "covers")
+COVER_FETCHER = os.getenv("COVER_FETCHER", "http")  # http or local
+COVER_STUB_DIR = os.getenv("COVER_STUB_DIR", "cover_stubs")
+COVER_FETCH_WORKERS = int(os.getenv("COVER_FETCH_WORKERS", "2"))
+COVER_FETCH_TIMEOUT_SECONDS = float(
+    os.getenv("COVER_FETCH_TIMEOUT_SECONDS", "10"))
+COVER_MAX_BYTES = int(os.getenv("COVER_MAX_BYTES", str(5 * 1024 * 1024)))
+COVER_MAX_AGE_SECONDS = int(os.getenv("COVER_MAX_AGE_SECONDS", "86400"))
+# A failed fetch is retried after COVER_RETRY_SECONDS, doubling per further failure up to the max
+COVER_RETRY_SECONDS = float(os.getenv("COVER_RETRY_SECONDS", "300"))
+COVER_RETRY_MAX_SECONDS = float(os.getenv("COVER_RETRY_MAX_SECONDS", "86400"))
+
+ORIGINAL = 'original'
+# Variant name -> bounding box in pixels; images are never upscaled
+COVER_SIZES = {'small': 64, 'medium': 150}
+# Formats accepted by their magic number when Pillow is not installed to check the image itself
+_IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+
+class CoverFetcher(ABC):
+    ''' Downloads cover art; returns the image bytes and their content type '''
+
+    @abstractmethod
+    def fetch(self, url: str) -> tuple[bytes, str]:
+        ...
+
+
+class HttpCoverFetcher(CoverFetcher):
+    def __init__(self, user_agent: str):
+        self._session = requests.Session()
+        self._session.headers['User-Agent'] = user_agent
+
+    def fetch(self, url: str) -> tuple[bytes, str]:
+        with self._session.get(url, timeout=COVER_FETCH_TIMEOUT_SECONDS, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if not content_type.startswith('image/'):
+                raise ValueError(f'Cover is not an image ({content_type or "no content type"}): {url}')
+            content = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                content.extend(chunk)
+                if len(content) > COVER_MAX_BYTES:
+                    raise ValueError(f'Cover larger than {COVER_MAX_BYTES} bytes: {url}')
+        return bytes(content), content_type
+
+
+class LocalCoverFetcher(CoverFetcher):
+    ''' Serves covers from a local directory by the file name in the URL, for development and tests '''
+
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    def fetch(self, url: str) -> tuple[bytes, str]:
+        path = os.path.join(self._directory, os.path.basename(urlparse(url).path))
+        with open(path, 'rb') as f:
+            content = f.read()
+        return content, mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+class CoverStore:
+    '''
+    Content-addressed cover storage: {root}/{sha256[:2]}/{sha256}/{variant}.
+    Files are written to a temporary name and renamed, so readers never see a partial file.
+    '''
+
+    def __init__(self, root: str):
+        self._root = root
+
+    def path(self, sha256: str, variant: str) -> str:
+        return os.path.join(self._root, sha256[:2], sha256, variant)
+
+    def has(self, sha256: str, variant: str) -> bool:
+        return os.path.isfile(self.path(sha256, variant))
+
+    def _write(self, sha256: str, variant: str, content: bytes) -> None:
+        path = self.path(sha256, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def put(self, content: bytes, content_type: str) -> tuple[str, str]:
+        '''
+        Store the original image and its size variants; returns the content hash and the image's content type.
+        Raises ValueError, before anything is written, when the content is not a valid image.
+        '''
+        content_type = _image_content_type(content, content_type)
+        sha256 = hashlib.sha256(content).hexdigest()
+        if not self.has(sha256, ORIGINAL):
+            self._write(sha256, ORIGINAL, content)
+        for variant, resized in _resize(content, [v for v in COVER_SIZES if not self.has(sha256, v)]):
+            self._write(sha256, variant, resized)
+        return sha256, content_type
+
+
+def _image_content_type(content: bytes, content_type: str) -> str:
+    '''
+    The content type of a valid image, detected from the content; raises ValueError otherwise.
+    Pillow checks the image when installed, else only the formats in _IMAGE_SIGNATURES are accepted.
+    '''
+    if not content_type.startswith('image/'):
+        raise ValueError(f'Not an image: {content_type}')
+    try:
+        from PIL import Image
+    except ImportError:
+        for signature, signature_type in _IMAGE_SIGNATURES:
+            if content.startswith(signature):
+                return signature_type
+        if content[:4] == b'RIFF' and content[8:12] == b'WEBP':
+            return 'image/webp'
+        raise ValueError(f'Unrecognized image format, declared as {content_type}')
+
+    try:
+        with Image.open(BytesIO(content)) as image:
+            image.verify()
+            detected = Image.MIME.get(image.format)
+    except Exception as e:
+        raise ValueError(f'Invalid image, declared as {content_type}: {str(e)}')
+    return detected if detected and detected.startswith('image/') else content_type
+
+
+def _resize(content: bytes, variants: list[str]) -> list[tuple[str, bytes]]:
+    ''' JPEG variants of the image; none when Pillow is not installed '''
+    if not variants:
+        return []
+    try:
+        # Imported here so Pillow is only needed for size variants
+        from PIL import Image
+    except ImportError:
+        logging.warning('Pillow is not installed, only original covers are stored')
+        return []
+
+    resized = []
+    with Image.open(BytesIO(content)) as image:
+        image = image.convert('RGB')
+        for variant in variants:
+            copy = image.copy()
+            copy.thumbnail((COVER_SIZES[variant], COVER_SIZES[variant]))
+            buffer = BytesIO()
+            copy.save(buffer, format='JPEG', quality=85, optimize=True)
+            resized.append((variant, buffer.getvalue()))
+    return resized
+
+
+def create_cover_fetcher() -> CoverFetcher:
+    if COVER_FETCHER == 'local':
+        return LocalCoverFetcher(COVER_STUB_DIR)
+    if COVER_FETCHER == 'http':
+        return HttpCoverFetcher(f'{os.getenv("APP_NAME")}/{os.getenv("APP_VERSION")}')
+    raise RuntimeError(f'Unknown COVER_FETCHER: {COVER_FETCHER}')
+
+
+cover_fetcher = create_cover_fetcher()
+cover_store = CoverStore(COVER_STORE_DIR)
+
+_executor = ThreadPoolExecutor(
+    max_workers=COVER_FETCH_WORKERS, thread_name_prefix='covers')
+_in_flight: set[int] = set()
+# album_id -> (failed attempts, monotonic time before which the fetch is not retried)
+_retry_after: dict[int, tuple[int, float]] = {}
+_in_flight_lock = Lock()
+
+
+def variant_content_type(cover: AlbumCover, variant: str) -> str:
+    return cover.content_type if variant == ORIGINAL else 'image/jpeg'
+
+
+def schedule_cover_fetch(album_id: int, image_url: str | None) -> None:
+    ''' Fetch an album's cover in the background, once, unless a recent attempt failed '''
+    if not image_url:
+        return
+    with _in_flight_lock:
+        if album_id in _in_flight:
+            return
+        if album_id in _retry_after and time.monotonic() < _retry_after[album_id][1]:
+            return
+        _in_flight.add(album_id)
+    _executor.submit(_fetch_cover, album_id, image_url)
+
+
+def schedule_cover_fetch_after_commit(db: Session, album_id: int, image_url: str | None) -> None:
+    ''' Defer the fetch until the album row is committed; dropped if the transaction rolls back '''
+    if image_url:
+        db.info.setdefault('pending_covers', []).append((album_id, image_url))
+
+
+@event.listens_for(SessionLocal, 'after_commit')
+def _schedule_pending_covers(session: Session) -> None:
+    for album_id, image_url in session.info.pop('pending_covers', []):
+        schedule_cover_fetch(album_id, image_url)
+
+
+@event.listens_for(SessionLocal, 'after_rollback')
+def _drop_pending_covers(session: Session) -> None:
+    session.info.pop('pending_covers', None)
+
+
+def _fetch_cover(album_id: int, image_url: str) -> None:
+    try:
+        with SessionLocal() as db:
+            db_cover = db.get(AlbumCover, album_id)
+            if db_cover and cover_store.has(db_cover.sha256, ORIGINAL):
+                return
+
+        # No DB connection is held while downloading and resizing
+        content, content_type = cover_fetcher.fetch(image_url)
+        sha256, content_type = cover_store.put(content, content_type)
+
+        with SessionLocal() as db:
+            stmt = upsert(db, AlbumCover).values(
+                album_id=album_id,
+                sha256=sha256,
+                content_type=content_type,
+                source_url=image_url,
+                fetched_at=datetime.now(timezone.utc)
+            )
+            # A refetch replaces a row whose file went missing, possibly with a different image
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[AlbumCover.album_id],
+                set_={
+                    'sha256': stmt.excluded.sha256,
+                    'content_type': stmt.excluded.content_type,
+                    'source_url': stmt.excluded.source_url,
+                    'fetched_at': stmt.excluded.fetched_at
+                }
+            ))
+            db.commit()
+            logging.info(f'Stored cover for album: {album_id} ({sha256})')
+
+        with _in_flight_lock:
+            _retry_after.pop(album_id, None)
+
+    except Exception as e:
+        with _in_flight_lock:
+            attempts = _retry_after.get(album_id, (0, 0.0))[0] + 1
+            delay = min(COVER_RETRY_SECONDS * 2 ** min(attempts - 1, 16), COVER_RETRY_MAX_SECONDS)
+            _retry_after[album_id] = (attempts, time.monotonic() + delay)
+        logging.error(
+            f'Cover fetch failed for album: {album_id} (attempt {attempts}, retry in {delay:.0f}s): {str(e)}')
+
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(album_id)
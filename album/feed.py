@@ -0,0 +1,229 @@
+from collections import deque
+from datetime import timezone
+from threading import Event, Lock, Thread
+from typing import Optional
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+from database.core import SessionLocal
+from entities.feed import FeedEntry
+from .model import FeedEvent
+import asyncio
+import logging
+import time
+import dotenv
+import os
+
+dotenv.load_dotenv()
+FEED_CAPACITY = int(os.getenv("FEED_CAPACITY", "500"))
+FEED_MAX_WAIT_SECONDS = float(os.getenv("FEED_MAX_WAIT_SECONDS", "25"))
+# How often each worker pulls events written by other workers
+FEED_POLL_SECONDS = float(os.getenv("FEED_POLL_SECONDS", "1"))
+# How long a missing id below a visible one is waited for before it is taken as rolled back
+FEED_GAP_GRACE_SECONDS = float(os.getenv("FEED_GAP_GRACE_SECONDS", "5"))
+# Rows kept in feed_events; older ones are pruned
+FEED_RETENTION = int(os.getenv("FEED_RETENTION", str(FEED_CAPACITY * 4)))
+FEED_PRUNE_SECONDS = float(os.getenv("FEED_PRUNE_SECONDS", "300"))
+
+# Event kinds
+RATING_CREATED = 'rated'
+RATING_UPDATED = 'updated'
+RATING_DELETED = 'deleted'
+RATINGS_CLEARED = 'cleared'
+
+
+class FeedBuffer:
+    '''
+    Bounded ring buffer of recent rating events, as seen by this worker.
+    Event sequence numbers are feed_events ids, shared by all workers, and clients pass them back as the
+    `after` cursor. Publishing is thread safe and wakes up long-polling waiters on their event loops.
+    '''
+
+    def __init__(self, capacity: int):
+        self._events: deque[FeedEvent] = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = Lock()
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def publish(self, events: list[FeedEvent]) -> None:
+        ''' Append events in increasing seq order '''
+        if not events:
+            return
+        with self._lock:
+            self._events.extend(events)
+            self._seq = events[-1].seq
+            waiters, self._waiters = self._waiters, []
+
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def since(self, after: int, limit: int) -> tuple[list[FeedEvent], int]:
+        ''' Up to `limit` events newer than the cursor, oldest first, and the cursor to resume from '''
+        # A cursor ahead of this worker (issued by one that polled more recently) simply waits for it
+        with self._lock:
+            events = [event for event in self._events if event.seq > after][:limit]
+        return events, events[-1].seq if events else after
+
+    async def wait_for(self, after: int, limit: int, timeout: float) -> tuple[list[FeedEvent], int]:
+        ''' Long-poll: return as soon as there are events newer than the cursor, or after the timeout '''
+        events, cursor = self.since(after, limit)
+        if events or timeout <= 0:
+            return events, cursor
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        with self._lock:
+            # Re-check under the lock so a publish between since() and here is not missed
+            if self._seq > after:
+                waiter.set_result(None)
+            else:
+                self._waiters.append((loop, waiter))
+
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._waiters = [
+                    entry for entry in self._waiters if entry[1] is not waiter]
+
+        return self.since(after, limit)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+feed = FeedBuffer(FEED_CAPACITY)
+
+
+def _to_event(entry: FeedEntry) -> FeedEvent:
+    return FeedEvent(
+        seq=entry.id,
+        kind=entry.kind,
+        user_id=entry.user_id,
+        album_id=entry.album_id,
+        title=entry.title,
+        artist=entry.artist,
+        image_url=entry.image_url,
+        rating=entry.rating,
+        # Stored as naive UTC; events are served timezone aware
+        occurred_at=entry.occurred_at.replace(tzinfo=timezone.utc)
+    )
+
+
+class FeedPoller:
+    '''
+    Pulls events written by any worker from feed_events into this worker's buffer, in id order, on one
+    background thread, so requests are served from memory. Ids are taken at insert but become visible at
+    commit, so an id missing below a visible one is waited for up to `gap_grace_seconds` before it is
+    skipped as rolled back; the buffer never gets an event below one it already has.
+    '''
+
+    def __init__(self, buffer: FeedBuffer, poll_seconds: float, gap_grace_seconds: float):
+        self._buffer = buffer
+        self._poll_seconds = poll_seconds
+        self._gap_grace_seconds = gap_grace_seconds
+        # Every id up to here has been published or skipped
+        self._last_id = 0
+        self._pending: dict[int, FeedEvent] = {}
+        self._gap_since: Optional[float] = None
+        self._pruned_at = 0.0
+        self._wakeup = Event()
+        self._thread: Optional[Thread] = None
+
+    def backfill(self, db: Session) -> None:
+        ''' Seed the buffer with the most recent events so it is not empty after a restart '''
+        entries = db.execute(
+            select(FeedEntry).order_by(FeedEntry.id.desc()).limit(FEED_CAPACITY)
+        ).scalars().all()
+
+        self._buffer.publish([_to_event(entry) for entry in reversed(entries)])
+        self._last_id = entries[0].id if entries else 0
+        logging.info(f'Backfilled feed with {len(entries)} events')
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name='feed-poller', daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        ''' Poll now instead of at the next interval, e.g. after this worker committed an event '''
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self._poll_seconds)
+            self._wakeup.clear()
+            try:
+                with SessionLocal() as db:
+                    self.poll(db)
+                    if time.monotonic() - self._pruned_at >= FEED_PRUNE_SECONDS:
+                        self._prune(db)
+            except Exception as e:
+                logging.error(f'Feed poll failed: {str(e)}')
+
+    def poll(self, db: Session) -> None:
+        entries = db.execute(
+            select(FeedEntry)
+            .where(FeedEntry.id > self._last_id)
+            .order_by(FeedEntry.id)
+            .limit(FEED_CAPACITY)
+        ).scalars().all()
+        for entry in entries:
+            self._pending.setdefault(entry.id, _to_event(entry))
+
+        ready = []
+        while self._pending:
+            next_id = self._last_id + 1
+            if next_id in self._pending:
+                ready.append(self._pending.pop(next_id))
+                self._last_id = next_id
+                self._gap_since = None
+                continue
+
+            if self._gap_since is None:
+                self._gap_since = time.monotonic()
+            if time.monotonic() - self._gap_since < self._gap_grace_seconds:
+                break
+            skip_to = min(self._pending) - 1
+            logging.warning(f'Feed ids {next_id}..{skip_to} never committed, skipping')
+            self._last_id = skip_to
+            self._gap_since = None
+
+        self._buffer.publish(ready)
+
+    def _prune(self, db: Session) -> None:
+        # Every worker prunes; the statement is idempotent
+        db.execute(delete(FeedEntry).where(FeedEntry.id <= self._last_id - FEED_RETENTION))
+        db.commit()
+        self._pruned_at = time.monotonic()
+
+
+poller = FeedPoller(feed, FEED_POLL_SECONDS, FEED_GAP_GRACE_SECONDS)
+
+
+def record_event(db: Session, kind: str, user_id: int, album_id: Optional[int] = None, title: Optional[str] = None,
+                 artist: Optional[str] = None, image_url: Optional[str] = None, rating: Optional[int] = None) -> None:
+    ''' Add an event to the caller's transaction; every worker picks it up once it is committed '''
+    db.add(FeedEntry(
+        kind=kind,
+        user_id=user_id,
+        album_id=album_id,
+        title=title,
+        artist=artist,
+        image_url=image_url,
+        rating=rating
+    ))
+    db.info['feed_recorded'] = True
+
+
+@event.listens_for(SessionLocal, 'after_commit')
+def _wake_poller(session: Session) -> None:
+    # This worker's own events show up without waiting for the next poll
+    if session.info.pop('feed_recorded', False):
+        poller.wake()
+
+
+@event.listens_for(SessionLocal, 'after_rollback')
+def _drop_recorded(session: Session) -> None:
+    session.info.pop('feed_recorded', None)
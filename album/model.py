@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from typing import Annotated
 from pydantic import BaseModel, Field
 from datetime import datetime
@@ -38,6 +38,7 @@ class AlbumInfoCreateRequest(BaseModel):
     artist: str
     release_date: Optional[str] = None  # ISO format date string
     genre: Optional[str] = None
+    genres: List[str] = []  # individual genres, stored normalized in the genres table
     image_url: Optional[str] = None  # URL or path to the cover image
 
 
@@ -48,3 +49,36 @@ class AlbumInfoResponse(BaseModel):
     release_date: Optional[str] = None
     genre: Optional[str] = None
     image_url: Optional[str] = None  # URL or path to the cover image
+
+
+class AlbumResolveItem(BaseModel):
+    title: str
+    artist: str
+
+
+class AlbumResolveRequest(BaseModel):
+    albums: List[AlbumResolveItem]
+
+
+class AlbumResolveResponse(BaseModel):
+    title: str
+    artist: str
+    status: str  # resolved, not_found, or unavailable (transient, retry later)
+    album: Optional[AlbumInfoResponse] = None  # None unless resolved
+
+
+class FeedEvent(BaseModel):
+    seq: int
+    kind: str  # rated, updated, deleted or cleared
+    user_id: int
+    album_id: Optional[int] = None
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    image_url: Optional[str] = None
+    rating: Optional[int] = None
+    occurred_at: datetime
+
+
+class FeedResponse(BaseModel):
+    events: List[FeedEvent]
+    cursor: int  # pass back as `after` to receive only newer events
@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import BoundedSemaphore, Lock
+from typing import Callable, TypeVar
+import logging
+import time
+
+T = TypeVar('T')
+
+
+class ExternalCallRejected(Exception):
+    ''' Raised when a guarded call is not attempted or does not finish in time '''
+
+
+class CircuitOpenError(ExternalCallRejected):
+    pass
+
+
+class BulkheadFullError(ExternalCallRejected):
+    pass
+
+
+class DeadlineExceededError(ExternalCallRejected):
+    pass
+
+
+class CircuitBreaker:
+    '''
+    Opens after `failure_threshold` consecutive failures (calls slower than `slow_call_seconds` count as failures)
+    and rejects calls for `reset_seconds`. After that it lets calls through half-open: the next result closes it
+    again on success or reopens it on failure.
+    '''
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name: str, failure_threshold: int, slow_call_seconds: float, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = Lock()
+
+    def retry_after(self) -> float:
+        ''' Seconds until an open breaker lets calls through again '''
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                logging.info(f'Circuit {self.name} half-open')
+                self.state = self.HALF_OPEN
+            return self.state != self.OPEN
+
+    def record_success(self, duration: float) -> None:
+        if duration > self.slow_call_seconds:
+            logging.warning(
+                f'Slow call on circuit {self.name}: {duration:.2f}s')
+            self.record_failure()
+            return
+
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f'Circuit {self.name} closed')
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.error(
+                        f'Circuit {self.name} open after {self._failures} failures')
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ExternalCallGuard:
+    '''
+    Runs calls to an external dependency behind a circuit breaker, a bulkhead of `max_concurrency` slots and a
+    per-call deadline. A call that misses its deadline keeps holding its slot until it really returns, so a hung
+    dependency can never tie up more than `max_concurrency` threads; the wrapped function must therefore time out
+    on its own (e.g. socket timeouts).
+    '''
+
+    def __init__(self, name: str, breaker: CircuitBreaker, max_concurrency: int,
+                 queue_timeout_seconds: float, deadline_seconds: float):
+        self.name = name
+        self.breaker = breaker
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self._slots = BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix=name)
+
+    def call(self, fn: Callable[..., T], *args, is_failure: Callable[[Exception], bool] = lambda e: True) -> T:
+        ''' Call fn(*args); `is_failure` decides which exceptions count against the breaker '''
+        if not self.breaker.allow():
+            raise CircuitOpenError(f'Circuit {self.name} is open')
+
+        if not self._slots.acquire(timeout=self.queue_timeout_seconds):
+            # Our own load shedding, not a failure of the dependency; a hung one trips the deadline below
+            raise BulkheadFullError(f'No free {self.name} slots')
+
+        started = time.monotonic()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            result = future.result(timeout=self.deadline_seconds)
+        except FutureTimeoutError:
+            self.breaker.record_failure()
+            raise DeadlineExceededError(
+                f'{self.name} call exceeded {self.deadline_seconds}s')
+        except Exception as e:
+            if is_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success(time.monotonic() - started)
+            raise
+
+        self.breaker.record_success(time.monotonic() - started)
+        return result
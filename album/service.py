@@ -1,14 +1,23 @@
 from fastapi import HTTPException
-from entities.album import Rating, Album
-from database.core import DbSession
+from entities.album import Rating, Album, AlbumCover
+from entities.genre import Genre, album_genres
+from database.core import DbSession, engine, upsert
 from auth.service import CurrentUser
-from .model import RatingDeleteRequest, RatingResponse, RatingCreateRequest, RatingUpdateRequest, AlbumInfoResponse, AlbumInfoCreateRequest
-from .utils import get_album_info
+from .model import RatingDeleteRequest, RatingResponse, RatingCreateRequest, RatingUpdateRequest, AlbumInfoResponse, AlbumInfoCreateRequest, AlbumResolveRequest, AlbumResolveResponse
+from .utils import get_album_info, DISCOGS_MAX_CONCURRENCY
+from .covers import cover_store, schedule_cover_fetch, schedule_cover_fetch_after_commit, variant_content_type, ORIGINAL, COVER_SIZES
+from .feed import record_event, RATING_CREATED, RATING_UPDATED, RATING_DELETED, RATINGS_CLEARED
 from utils.current_user_utils import get_current_db_user
-from messages.error_messages import RATING_ALREADY_EXISTS, ALBUM_CREATION_FAILED, USER_NOT_FOUND, RATING_NOT_FOUND, RATINGS_NOT_FOUND, ALBUM_NOT_FOUND, RATING_CREATION_FAILED, ALBUM_ALREADY_EXISTS
+from users.service import invalidate_profile_stats
+from messages.error_messages import RATING_ALREADY_EXISTS, ALBUM_CREATION_FAILED, USER_NOT_FOUND, RATING_NOT_FOUND, RATINGS_NOT_FOUND, ALBUM_NOT_FOUND, ALBUM_ALREADY_EXISTS, ALBUM_RESOLVE_BATCH_TOO_LARGE, COVER_NOT_FOUND, COVER_SIZE_INVALID
 from messages.success_messages import ALBUM_DATABASE_INSERTION_SUCCESS, ALL_RATINGS_DELETION_SUCCESS, RATING_CREATION_SUCCESS, RATING_DELETION_SUCCESS, RATING_UPDATE_SUCCESS
-from sqlalchemy import func
+from sqlalchemy import func, select, values, column, true, Integer, String
+from sqlalchemy.exc import IntegrityError
+from abc import ABC, abstractmethod
+from threading import Lock
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import logging
+import time
 import dotenv
 import os
 
@@ -16,6 +25,35 @@ import os
 dotenv.load_dotenv()
 STRING_SIMILARITY_THRESHOLD = float(
     os.getenv("STRING_SIMILARITY_THRESHOLD", "0.8"))
+ALBUM_RESOLVE_MAX_BATCH = int(os.getenv("ALBUM_RESOLVE_MAX_BATCH", "100"))
+# Total time a resolve request may spend on external lookups
+ALBUM_RESOLVE_TIMEOUT_SECONDS = float(
+    os.getenv("ALBUM_RESOLVE_TIMEOUT_SECONDS", "15"))
+# Discogs slots batch resolution may use across all requests, leaving the rest to interactive lookups
+ALBUM_RESOLVE_CONCURRENCY = int(os.getenv(
+    "ALBUM_RESOLVE_CONCURRENCY", str(max(1, DISCOGS_MAX_CONCURRENCY // 2))))
+
+# Per-item resolve statuses
+RESOLVED = 'resolved'
+NOT_FOUND = 'not_found'
+UNAVAILABLE = 'unavailable'
+ALBUM_MATCHER = os.getenv(
+    "ALBUM_MATCHER", "pg_trgm" if engine.dialect.name == "postgresql" else "memory")
+ALBUM_CATALOG_REFRESH_SECONDS = float(
+    os.getenv("ALBUM_CATALOG_REFRESH_SECONDS", "30"))
+# Ids below the highest loaded one that are re-read on refresh, for albums committed out of id order
+ALBUM_CATALOG_RESCAN_IDS = int(os.getenv("ALBUM_CATALOG_RESCAN_IDS", "1000"))
+# Catalog entries scored at once, bounding the score matrix to pairs x chunk
+ALBUM_MATCHER_CHUNK_SIZE = int(os.getenv("ALBUM_MATCHER_CHUNK_SIZE", "20000"))
+
+# In-flight external lookups, keyed by the normalized (artist, title) pair,
+# so concurrent requests for the same unknown album share one Discogs call
+_album_lookups: dict[tuple[str, str], Future] = {}
+_album_lookups_lock = Lock()
+
+# Shared by all resolve requests, so batches together never hold more than their share of Discogs slots
+_resolve_executor = ThreadPoolExecutor(
+    max_workers=ALBUM_RESOLVE_CONCURRENCY, thread_name_prefix='resolve')
 
 
 def get_ratings(db: DbSession, current_user: CurrentUser):
@@ -29,21 +67,20 @@ def get_ratings(db: DbSession, current_user: CurrentUser):
         logging.error(USER_NOT_FOUND)
         raise HTTPException(status_code=404, detail=USER_NOT_FOUND)
 
-    ratings_db = db.query(Rating).filter(Rating.user_id == user_id).all()
+    # Filtering on user_id lets Postgres prune to a single partition of ratings
+    ratings_db = (
+        db.query(Rating, Album)
+        .join(Album, Album.id == Rating.album_id)
+        .filter(Rating.user_id == user_id)
+        .all()
+    )
     if not ratings_db:
         logging.error(RATINGS_NOT_FOUND)
         raise HTTPException(status_code=404, detail=RATINGS_NOT_FOUND)
 
     ratings = []
 
-    for rating_db in ratings_db:
-        album_db = db.query(Album).filter(
-            Album.id == rating_db.album_id).first()
-
-        if not album_db:
-            logging.error(ALBUM_NOT_FOUND)
-            raise HTTPException(status_code=404, detail=ALBUM_NOT_FOUND)
-
+    for rating_db, album_db in ratings_db:
         rating = RatingResponse(
             title=album_db.title,
             artist=album_db.artist,
@@ -81,60 +118,383 @@ def search_album(artist_name: str, album_name: str, db: DbSession) -> AlbumInfoR
     else:
         logging.info(
             f'Album not found in database, fetching from external API: {album_name} by {artist_name}')
-        album_info = get_album_info(artist_name, album_name)
-        db_album = create_album(album_info, db)
+        # Return the connection to the pool while waiting on the external API;
+        # the session checks out a new one for the insert
+        db.close()
+        album_info = fetch_album_info(artist_name, album_name)
+        return create_album(album_info, db)
 
-        return AlbumInfoResponse(
-            album_id=db_album.id,
-            title=album_info.title,
-            artist=album_info.artist,
-            release_date=album_info.release_date,
-            genre=album_info.genre,
-            image_url=album_info.image_url
-        )
+
+def fetch_album_info(artist_name: str, album_name: str) -> AlbumInfoCreateRequest:
+    ''' Fetch album info from the external API, sharing the call with concurrent requests for the same album '''
+    key = (artist_name.strip().lower(), album_name.strip().lower())
+
+    with _album_lookups_lock:
+        lookup = _album_lookups.get(key)
+        is_leader = lookup is None
+        if is_leader:
+            lookup = Future()
+            _album_lookups[key] = lookup
+
+    if not is_leader:
+        logging.info(
+            f'Waiting on in-flight lookup for: {album_name} by {artist_name}')
+        return lookup.result()
+
+    try:
+        lookup.set_result(get_album_info(artist_name, album_name))
+    except Exception as e:
+        lookup.set_exception(e)
+    finally:
+        with _album_lookups_lock:
+            del _album_lookups[key]
+
+    return lookup.result()
 
 
-def create_album(album_info: AlbumInfoCreateRequest, db: DbSession):
-    ''' Create a new album in the database '''
+def create_album(album_info: AlbumInfoCreateRequest, db: DbSession) -> AlbumInfoResponse:
+    ''' Insert an album into the database, or return the existing row if it is already there.
+    The caller owns the transaction and is responsible for committing. '''
     logging.info(
         f'Inserting album: {album_info.title} by {album_info.artist} into the database')
-    new_album = Album(
+    stmt = upsert(db, Album).values(
         title=album_info.title,
         artist=album_info.artist,
         release_date=album_info.release_date,
         genre=album_info.genre,
         image_url=album_info.image_url
     )
+    # A no-op update (instead of DO NOTHING) makes RETURNING yield the existing row on conflict
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Album.title, Album.artist],
+        set_={'title': stmt.excluded.title}
+    ).returning(Album.id, Album.title, Album.artist, Album.release_date, Album.genre, Album.image_url)
 
-    if not new_album:
-        logging.error('Failed to create a new album instance')
+    db_album = db.execute(stmt).one_or_none()
+
+    if not db_album:
+        logging.error(ALBUM_CREATION_FAILED)
         raise HTTPException(status_code=500, detail=ALBUM_CREATION_FAILED)
 
-    db.add(new_album)
-    db.commit()
-    db.refresh(new_album)
+    link_album_genres(db_album.id, album_info.genres, db)
+    schedule_cover_fetch_after_commit(db, db_album.id, db_album.image_url)
+
     logging.info(ALBUM_DATABASE_INSERTION_SUCCESS)
-    return new_album
+    return AlbumInfoResponse(
+        album_id=db_album.id,
+        title=db_album.title,
+        artist=db_album.artist,
+        release_date=db_album.release_date,
+        genre=db_album.genre,
+        image_url=db_album.image_url
+    )
 
 
-def verify_album_exists(artist_name: str, album_name: str, db: DbSession):
-    ''' Check if an album already exists in the database '''
-    db_album = (
-        db.query(Album)
-        .filter(
-            func.similarity(
-                Album.artist, artist_name) > STRING_SIMILARITY_THRESHOLD,
-            func.similarity(
-                Album.title, album_name) > STRING_SIMILARITY_THRESHOLD
+def link_album_genres(album_id: int, genre_names: list[str], db: DbSession):
+    ''' Upsert the album's genres into the genres table and link them to the album '''
+    names = sorted({name.strip() for name in genre_names if name.strip()})
+    if not names:
+        return
+
+    stmt = upsert(db, Genre).values([{'name': name} for name in names])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Genre.name],
+        set_={'name': stmt.excluded.name}
+    ).returning(Genre.id)
+    genre_ids = db.execute(stmt).scalars().all()
+
+    db.execute(
+        upsert(db, album_genres)
+        .values([{'album_id': album_id, 'genre_id': genre_id} for genre_id in genre_ids])
+        .on_conflict_do_nothing()
+    )
+
+
+class AlbumMatcher(ABC):
+    ''' Fuzzy matches (artist, title) pairs against the albums catalog '''
+
+    def match(self, artist_name: str, album_name: str, db: DbSession) -> Album | None:
+        return self.match_many([(artist_name, album_name)], db)[0]
+
+    @abstractmethod
+    def match_many(self, pairs: list[tuple[str, str]], db: DbSession) -> list[Album | None]:
+        ...
+
+    def add(self, album_id: int, artist_name: str, album_name: str) -> None:
+        ''' Make a newly committed album visible to the matcher '''
+
+
+class PgTrgmMatcher(AlbumMatcher):
+    ''' Matches in Postgres using pg_trgm similarity '''
+
+    def match(self, artist_name: str, album_name: str, db: DbSession) -> Album | None:
+        return (
+            db.query(Album)
+            .filter(
+                func.similarity(
+                    Album.artist, artist_name) > STRING_SIMILARITY_THRESHOLD,
+                func.similarity(
+                    Album.title, album_name) > STRING_SIMILARITY_THRESHOLD
+            )
+            .order_by(
+                (func.similarity(Album.artist, artist_name) +
+                 func.similarity(Album.title, album_name)).desc()
+            )
+            .first()
         )
-        .order_by(
-            func.similarity(Album.artist, artist_name) +
-            func.similarity(Album.title, album_name)
+
+    def match_many(self, pairs: list[tuple[str, str]], db: DbSession) -> list[Album | None]:
+        if not pairs:
+            return []
+
+        query = values(
+            column('idx', Integer),
+            column('artist', String),
+            column('title', String),
+            name='query'
+        ).data([(idx, artist, title) for idx, (artist, title) in enumerate(pairs)])
+
+        # Best-ranked album for each input row, evaluated per row via LATERAL
+        match = (
+            select(Album.id)
+            .where(
+                func.similarity(
+                    Album.artist, query.c.artist) > STRING_SIMILARITY_THRESHOLD,
+                func.similarity(
+                    Album.title, query.c.title) > STRING_SIMILARITY_THRESHOLD
+            )
+            .order_by(
+                (func.similarity(Album.artist, query.c.artist) +
+                 func.similarity(Album.title, query.c.title)).desc()
+            )
+            .limit(1)
+            .correlate(query)
+            .lateral('match')
         )
-        .first()
-    )
 
-    return db_album
+        stmt = (
+            select(query.c.idx, Album)
+            .select_from(query)
+            .outerjoin(match, true())
+            .outerjoin(Album, Album.id == match.c.id)
+            .order_by(query.c.idx)
+        )
+
+        return [album for _, album in db.execute(stmt).all()]
+
+
+class InMemoryMatcher(AlbumMatcher):
+    ''' Matches in process against a normalized copy of the album catalog using rapidfuzz.
+    The catalog is loaded lazily and picks up albums inserted by other workers every refresh_seconds,
+    and right away when a lookup misses. '''
+
+    def __init__(self, refresh_seconds: float, rescan_ids: int, chunk_size: int):
+        # Imported here so the dependency is only needed when this backend is selected
+        from rapidfuzz import fuzz, process
+
+        self._scorer = fuzz.ratio
+        self._cdist = process.cdist
+        self._refresh_seconds = refresh_seconds
+        self._rescan_ids = rescan_ids
+        self._chunk_size = max(1, chunk_size)
+        self._refreshed_at = 0.0
+        self._max_loaded_id = 0
+        self._ids: list[int] = []
+        self._artists: list[str] = []
+        self._titles: list[str] = []
+        self._known_ids: set[int] = set()
+        self._lock = Lock()
+
+    @staticmethod
+    def _normalize(value: str) -> str:
+        return ' '.join(value.lower().split())
+
+    def _append(self, album_id: int, artist_name: str, album_name: str) -> None:
+        if album_id in self._known_ids:
+            return
+        self._known_ids.add(album_id)
+        self._ids.append(album_id)
+        self._artists.append(self._normalize(artist_name))
+        self._titles.append(self._normalize(album_name))
+
+    def _refresh(self, db: DbSession, force: bool = False) -> int:
+        ''' Load albums committed since the last refresh; returns how many were new '''
+        if not force and time.monotonic() - self._refreshed_at < self._refresh_seconds:
+            return 0
+
+        # Ids are taken at insert but become visible at commit, so an album can show up below
+        # the highest id already loaded; re-read a window under it and skip the known ones
+        rows = db.execute(
+            select(Album.id, Album.artist, Album.title)
+            .where(Album.id > self._max_loaded_id - self._rescan_ids)
+            .order_by(Album.id)
+        ).all()
+
+        with self._lock:
+            loaded = len(self._ids)
+            for album_id, artist_name, album_name in rows:
+                self._append(album_id, artist_name, album_name)
+                self._max_loaded_id = max(self._max_loaded_id, album_id)
+            loaded = len(self._ids) - loaded
+            self._refreshed_at = time.monotonic()
+
+        if loaded:
+            logging.info(f'Loaded {loaded} albums into the matcher catalog')
+        return loaded
+
+    def add(self, album_id: int, artist_name: str, album_name: str) -> None:
+        with self._lock:
+            self._append(album_id, artist_name, album_name)
+
+    def match_many(self, pairs: list[tuple[str, str]], db: DbSession) -> list[Album | None]:
+        if not pairs:
+            return []
+
+        self._refresh(db)
+        matched_ids = self._match_ids(pairs)
+
+        # The album may have been added by another worker since the last refresh
+        missed = [idx for idx, album_id in enumerate(matched_ids) if album_id is None]
+        if missed and self._refresh(db, force=True):
+            for idx, album_id in zip(missed, self._match_ids([pairs[idx] for idx in missed])):
+                matched_ids[idx] = album_id
+
+        wanted = {album_id for album_id in matched_ids if album_id is not None}
+        albums_db = {
+            album.id: album
+            for album in db.query(Album).filter(Album.id.in_(wanted)).all()
+        } if wanted else {}
+
+        return [albums_db.get(album_id) for album_id in matched_ids]
+
+    def _match_ids(self, pairs: list[tuple[str, str]]) -> list[int | None]:
+        # The catalog lists are append only, so entries below this size can be read without the lock
+        with self._lock:
+            size = len(self._ids)
+
+        artists = [self._normalize(artist) for artist, _ in pairs]
+        titles = [self._normalize(title) for _, title in pairs]
+        cutoff = STRING_SIMILARITY_THRESHOLD * 100
+        best_scores = [0.0] * len(pairs)
+        matched_ids: list[int | None] = [None] * len(pairs)
+
+        for start in range(0, size, self._chunk_size):
+            end = min(start + self._chunk_size, size)
+            # Scores under the cutoff come back as 0; only title matches are scored on artist
+            title_scores = self._cdist(
+                titles, self._titles[start:end], scorer=self._scorer, score_cutoff=cutoff)
+            for row, col in zip(*title_scores.nonzero()):
+                title_score = title_scores[row, col]
+                artist_score = self._scorer(
+                    artists[row], self._artists[start + col], score_cutoff=cutoff)
+                # Strict comparisons, so the threshold means the same as with pg_trgm
+                if (title_score > cutoff and artist_score > cutoff
+                        and artist_score + title_score > best_scores[row]):
+                    best_scores[row] = artist_score + title_score
+                    matched_ids[row] = self._ids[start + col]
+
+        return matched_ids
+
+
+def create_album_matcher() -> AlbumMatcher:
+    ''' Build the matcher selected by ALBUM_MATCHER, defaulting to pg_trgm on Postgres '''
+    if ALBUM_MATCHER == 'memory':
+        logging.info('Using in-memory album matcher')
+        return InMemoryMatcher(ALBUM_CATALOG_REFRESH_SECONDS, ALBUM_CATALOG_RESCAN_IDS, ALBUM_MATCHER_CHUNK_SIZE)
+    if ALBUM_MATCHER == 'pg_trgm':
+        return PgTrgmMatcher()
+    raise RuntimeError(f'Unknown ALBUM_MATCHER: {ALBUM_MATCHER}')
+
+
+album_matcher = create_album_matcher()
+
+
+def verify_album_exists(artist_name: str, album_name: str, db: DbSession):
+    ''' Check if an album already exists in the database '''
+    return album_matcher.match(artist_name, album_name, db)
+
+
+def verify_albums_exist(pairs: list[tuple[str, str]], db: DbSession) -> list[Album | None]:
+    ''' Match many (artist, title) pairs against the database, preserving input order '''
+    return album_matcher.match_many(pairs, db)
+
+
+def resolve_albums(resolve_request: AlbumResolveRequest, db: DbSession) -> list[AlbumResolveResponse]:
+    ''' Resolve many (artist, title) pairs to albums, fetching only the unmatched ones from the external API '''
+    if len(resolve_request.albums) > ALBUM_RESOLVE_MAX_BATCH:
+        logging.error(ALBUM_RESOLVE_BATCH_TOO_LARGE)
+        raise HTTPException(
+            status_code=400, detail=ALBUM_RESOLVE_BATCH_TOO_LARGE)
+
+    pairs = [(item.artist, item.title) for item in resolve_request.albums]
+    logging.info(f'Resolving {len(pairs)} albums')
+
+    resolved: list[AlbumInfoResponse | None] = [
+        AlbumInfoResponse(
+            album_id=album_db.id,
+            title=album_db.title,
+            artist=album_db.artist,
+            release_date=album_db.release_date,
+            genre=album_db.genre,
+            image_url=album_db.image_url
+        ) if album_db else None
+        for album_db in verify_albums_exist(pairs, db)
+    ]
+
+    statuses = [RESOLVED if album_info else NOT_FOUND for album_info in resolved]
+
+    # Group unmatched inputs so duplicate pairs only cost one external call
+    missing: dict[tuple[str, str], list[int]] = {}
+    for idx, (artist, title) in enumerate(pairs):
+        if resolved[idx] is None:
+            key = (artist.strip().lower(), title.strip().lower())
+            missing.setdefault(key, []).append(idx)
+
+    if missing:
+        logging.info(
+            f'{len(missing)} albums not found in database, fetching from external API')
+        # Return the connection to the pool while waiting on the external API
+        db.close()
+        lookups = {
+            key: _resolve_executor.submit(fetch_album_info, *pairs[indexes[0]])
+            for key, indexes in missing.items()
+        }
+        wait(lookups.values(), timeout=ALBUM_RESOLVE_TIMEOUT_SECONDS)
+        # Lookups still queued are dropped; running ones finish in the background
+        for lookup in lookups.values():
+            lookup.cancel()
+
+        for key, lookup in lookups.items():
+            if not lookup.done() or lookup.cancelled():
+                logging.warning(
+                    f'Resolve time budget exceeded for album: {pairs[missing[key][0]]}')
+                status = UNAVAILABLE
+                album_info = None
+            else:
+                try:
+                    album_info = create_album(lookup.result(), db)
+                    status = RESOLVED
+                except HTTPException as e:
+                    logging.error(
+                        f'Could not resolve album: {pairs[missing[key][0]]}: {e.detail}')
+                    status = NOT_FOUND if e.status_code == 404 else UNAVAILABLE
+                    album_info = None
+
+            for idx in missing[key]:
+                resolved[idx] = album_info
+                statuses[idx] = status
+
+        db.commit()
+        for album_info in resolved:
+            if album_info:
+                album_matcher.add(album_info.album_id,
+                                  album_info.artist, album_info.title)
+
+    return [
+        AlbumResolveResponse(title=title, artist=artist,
+                             status=status, album=album_info)
+        for (artist, title), status, album_info in zip(pairs, statuses, resolved)
+    ]
 
 
 def verify_rating_exists(album_id: int, user_id: int, db: DbSession):
@@ -148,40 +508,54 @@ def verify_rating_exists(album_id: int, user_id: int, db: DbSession):
 
 
 def rate_album(rating: RatingCreateRequest, db: DbSession, current_user: CurrentUser):
-    # Get the current user from the request context
-    db_user = get_current_db_user(db, current_user)
-    user_id = db_user.id
+    # The user id comes from the verified token; a missing user surfaces as a
+    # foreign key violation on insert instead of costing an extra lookup
+    user_id = current_user.user_id
 
-    # retrieve album info from external API
+    # retrieve album info from the database or the external API
     album_info = search_album(rating.artist, rating.title, db)
 
     if not album_info:
         logging.error(ALBUM_NOT_FOUND)
         raise HTTPException(status_code=404, detail=ALBUM_NOT_FOUND)
 
-    # Check if user already rated this album
-    existing_rating = verify_rating_exists(album_info.album_id, user_id, db)
+    # Insert the rating; an existing rating for this album by the user returns no row
+    stmt = (
+        upsert(db, Rating)
+        .values(user_id=user_id, album_id=album_info.album_id, rating=rating.rating)
+        .on_conflict_do_nothing(index_elements=[Rating.user_id, Rating.album_id])
+        .returning(Rating.created_at, Rating.rating)
+    )
+
+    try:
+        new_rating = db.execute(stmt).one_or_none()
+    except IntegrityError:
+        db.rollback()
+        logging.error(USER_NOT_FOUND)
+        raise HTTPException(status_code=404, detail=USER_NOT_FOUND)
 
-    if existing_rating:
+    if not new_rating:
+        # Keep a newly resolved album even though the rating is rejected
+        db.commit()
+        album_matcher.add(album_info.album_id, album_info.artist, album_info.title)
         logging.error(RATING_ALREADY_EXISTS)
         raise HTTPException(status_code=400, detail=RATING_ALREADY_EXISTS)
 
-    # Create a new rating in the database
-
-    new_rating = Rating(
+    record_event(
+        db,
+        RATING_CREATED,
         user_id=user_id,
         album_id=album_info.album_id,
-        rating=rating.rating
+        title=album_info.title,
+        artist=album_info.artist,
+        image_url=album_info.image_url,
+        rating=new_rating.rating
     )
 
-    if not new_rating:
-        logging.error(RATING_CREATION_FAILED)
-        raise HTTPException(status_code=500, detail=RATING_CREATION_FAILED)
-
-    # Add row to the database
-    db.add(new_rating)
+    # Album (if new), rating and feed event are committed together
     db.commit()
-    db.refresh(new_rating)
+    album_matcher.add(album_info.album_id, album_info.artist, album_info.title)
+    invalidate_profile_stats(user_id)
 
     logging.info(RATING_CREATION_SUCCESS)
     # Return the created rating with album info
@@ -211,8 +585,20 @@ def delete_rating(rating: RatingDeleteRequest, db: DbSession, current_user: Curr
         logging.error(RATING_NOT_FOUND)
         raise HTTPException(status_code=404, detail=RATING_NOT_FOUND)
 
+    record_event(
+        db,
+        RATING_DELETED,
+        user_id=db_user.id,
+        album_id=db_album.id,
+        title=db_album.title,
+        artist=db_album.artist,
+        image_url=db_album.image_url
+    )
+    user_id = db_user.id
+
     db.delete(db_rating)
     db.commit()
+    invalidate_profile_stats(user_id)
     logging.info(RATING_DELETION_SUCCESS)
     return {"detail": RATING_DELETION_SUCCESS}
 
@@ -220,14 +606,21 @@ def delete_rating(rating: RatingDeleteRequest, db: DbSession, current_user: Curr
 def delete_all_ratings(db: DbSession, current_user: CurrentUser):
     db_user = get_current_db_user(db, current_user)
 
-    ratings_db = db.query(Rating).filter(Rating.user_id == db_user.id).all()
-    if not ratings_db:
-        raise HTTPException(status_code=404, detail=RATINGS_NOT_FOUND)
+    user_id = db_user.id
 
-    for rating_db in ratings_db:
-        db.delete(rating_db)
+    # Single DELETE pruned to the user's partition instead of loading every row
+    deleted_count = (
+        db.query(Rating)
+        .filter(Rating.user_id == user_id)
+        .delete(synchronize_session=False)
+    )
+    if not deleted_count:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=RATINGS_NOT_FOUND)
 
+    record_event(db, RATINGS_CLEARED, user_id=user_id)
     db.commit()
+    invalidate_profile_stats(user_id)
     logging.info(ALL_RATINGS_DELETION_SUCCESS)
     return {"detail": ALL_RATINGS_DELETION_SUCCESS}
 
@@ -248,8 +641,19 @@ def change_rating(new_rating: RatingUpdateRequest, db: DbSession, current_user:
 
     # Update the rating
     db_rating.rating = new_rating.rating
+    record_event(
+        db,
+        RATING_UPDATED,
+        user_id=db_rating.user_id,
+        album_id=db_album.id,
+        title=db_album.title,
+        artist=db_album.artist,
+        image_url=db_album.image_url,
+        rating=new_rating.rating
+    )
     db.commit()
     db.refresh(db_rating)
+    invalidate_profile_stats(db_rating.user_id)
 
     logging.info(RATING_UPDATE_SUCCESS)
     return RatingResponse(
@@ -261,3 +665,29 @@ def change_rating(new_rating: RatingUpdateRequest, db: DbSession, current_user:
         created_at=db_rating.created_at,
         rating=db_rating.rating
     )
+
+
+def get_cover(album_id: int, size: str, db: DbSession) -> tuple[str, str, str] | str:
+    ''' Locate a stored cover variant: (path, content type, etag), or the remote URL while it is still being fetched '''
+    if size != ORIGINAL and size not in COVER_SIZES:
+        raise HTTPException(status_code=400, detail=COVER_SIZE_INVALID)
+
+    db_cover = db.get(AlbumCover, album_id)
+
+    if db_cover and cover_store.has(db_cover.sha256, size):
+        return (
+            cover_store.path(db_cover.sha256, size),
+            variant_content_type(db_cover, size),
+            f'"{db_cover.sha256}-{size}"'
+        )
+
+    # Not stored locally yet (e.g. albums created before covers were cached)
+    db_album = db.get(Album, album_id)
+    if not db_album or not db_album.image_url:
+        logging.error(COVER_NOT_FOUND)
+        raise HTTPException(status_code=404, detail=COVER_NOT_FOUND)
+
+    # Also refetch when the row outlived its file (store wiped, new container, another host on the same DB)
+    if not db_cover or not cover_store.has(db_cover.sha256, ORIGINAL):
+        schedule_cover_fetch(album_id, db_album.image_url)
+    return db_album.image_url
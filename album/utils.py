@@ -2,7 +2,12 @@ from fastapi import HTTPException
 import dotenv
 import os
 import discogs_client  # API
+import requests
+from discogs_client import exceptions as discogs_exceptions
+from discogs_client.fetchers import UserTokenRequestsFetcher
 from album.model import AlbumInfoCreateRequest
+from album.resilience import CircuitBreaker, ExternalCallGuard, ExternalCallRejected
+from messages.error_messages import ALBUM_NOT_FOUND, DISCOGS_UNAVAILABLE
 import logging
 
 dotenv.load_dotenv()
@@ -15,38 +20,103 @@ DISCOGS_TOKEN = os.getenv("DISCOGS_TOKEN")
 if not DISCOGS_TOKEN:
     raise RuntimeError("Missing DISCOGS_TOKEN in environment variables")
 
+# Resilience settings for Discogs calls
+DISCOGS_MAX_CONCURRENCY = int(os.getenv("DISCOGS_MAX_CONCURRENCY", "4"))
+DISCOGS_QUEUE_TIMEOUT_SECONDS = float(
+    os.getenv("DISCOGS_QUEUE_TIMEOUT_SECONDS", "0.5"))
+DISCOGS_DEADLINE_SECONDS = float(os.getenv("DISCOGS_DEADLINE_SECONDS", "5"))
+DISCOGS_SLOW_CALL_SECONDS = float(os.getenv("DISCOGS_SLOW_CALL_SECONDS", "2"))
+DISCOGS_BREAKER_FAILURE_THRESHOLD = int(
+    os.getenv("DISCOGS_BREAKER_FAILURE_THRESHOLD", "5"))
+DISCOGS_BREAKER_RESET_SECONDS = float(
+    os.getenv("DISCOGS_BREAKER_RESET_SECONDS", "30"))
+
+
+class TimeoutUserTokenFetcher(UserTokenRequestsFetcher):
+    ''' discogs-client's user token fetcher, with socket timeouts so a hung request gives its thread back '''
+
+    def __init__(self, user_token: str, timeout: float):
+        super().__init__(user_token)
+        self.timeout = timeout
+
+    def fetch(self, client, method, url, data=None, headers=None, json=True):
+        resp = requests.request(method, url, params={'token': self.user_token},
+                                data=data, headers=headers, timeout=self.timeout)
+        return resp.content, resp.status_code
+
+
 client = discogs_client.Client(
     APP_NAME+"/"+APP_VERSION, user_token=DISCOGS_TOKEN)
+client._fetcher = TimeoutUserTokenFetcher(
+    DISCOGS_TOKEN, DISCOGS_DEADLINE_SECONDS)
+
+discogs_guard = ExternalCallGuard(
+    'discogs',
+    CircuitBreaker(
+        'discogs',
+        failure_threshold=DISCOGS_BREAKER_FAILURE_THRESHOLD,
+        slow_call_seconds=DISCOGS_SLOW_CALL_SECONDS,
+        reset_seconds=DISCOGS_BREAKER_RESET_SECONDS
+    ),
+    max_concurrency=DISCOGS_MAX_CONCURRENCY,
+    queue_timeout_seconds=DISCOGS_QUEUE_TIMEOUT_SECONDS,
+    deadline_seconds=DISCOGS_DEADLINE_SECONDS
+)
+
+
+def _search_release(artist_name: str, album_name: str) -> AlbumInfoCreateRequest | None:
+    ''' Look the album up on Discogs; None when there are no results '''
+    results = client.search(
+        album_name, artist=artist_name, type='release')
+
+    if not results:
+        return None
+
+    release = results[0].master.main_release
+
+    title = release.title
+    artist = ', '.join(a.name for a in release.artists)
+    release_date = str(release.year) if release.year else 'Unknown'
+    genres = release.genres or release.styles or ['Unknown']
+    genre = ', '.join(genres)
+    image_url = release.thumb or None
+
+    return AlbumInfoCreateRequest(
+        title=title,
+        artist=artist,
+        release_date=release_date,
+        genre=genre,
+        genres=[g for g in genres if g != 'Unknown'],
+        image_url=image_url
+    )
+
+
+def _is_discogs_outage(error: Exception) -> bool:
+    ''' Only network errors, throttling and server errors count against the circuit breaker '''
+    if isinstance(error, discogs_exceptions.HTTPError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (requests.exceptions.RequestException, OSError))
 
 
 def get_album_info(artist_name: str, album_name: str) -> AlbumInfoCreateRequest:
     try:
-        results = client.search(
-            album_name, artist=artist_name, type='release')
-
-        if not results:
-            logging.error(
-                f'No results found for search: album={album_name}, artist={artist_name}')
-            raise HTTPException(status_code=404, detail="Album not found")
-
-        release = results[0].master.main_release
-
-        title = release.title
-        artist = ', '.join(a.name for a in release.artists)
-        release_date = str(release.year) if release.year else 'Unknown'
-        genres = release.genres or release.styles or ['Unknown']
-        genre = ', '.join(genres)
-        image_url = release.thumb or None
-
-        return AlbumInfoCreateRequest(
-            title=title,
-            artist=artist,
-            release_date=release_date,
-            genre=genre,
-            image_url=image_url
-        )
+        album_info = discogs_guard.call(
+            _search_release, artist_name, album_name, is_failure=_is_discogs_outage)
+
+    except ExternalCallRejected as e:
+        logging.warning(f'Album search API unavailable: {str(e)}')
+        retry_after = max(1, int(discogs_guard.breaker.retry_after()))
+        raise HTTPException(
+            status_code=503, detail=DISCOGS_UNAVAILABLE, headers={'Retry-After': str(retry_after)})
 
     except Exception as e:
         logging.error(f'Album search API error: {str(e)}')
         raise HTTPException(
             status_code=500, detail=f"Album search API error: {str(e)}")
+
+    if not album_info:
+        logging.error(
+            f'No results found for search: album={album_name}, artist={artist_name}')
+        raise HTTPException(status_code=404, detail=ALBUM_NOT_FOUND)
+
+    return album_info
@@ -1,6 +1,7 @@
 from fastapi import Depends
 from typing import Annotated
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from dotenv import load_dotenv
@@ -15,6 +16,18 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 
 engine = create_engine(DATABASE_URL)
 
+"""SQLite only enforces foreign keys when asked to, per connection."""
+if engine.dialect.name == 'sqlite':
+    @event.listens_for(engine, 'connect')
+    def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+"""Number of hash partitions (on user_id) for the ratings table; 0 keeps it a plain table. PostgreSQL only."""
+RATINGS_PARTITIONS = int(os.getenv("RATINGS_PARTITIONS", "0"))
+RATINGS_PARTITIONED = RATINGS_PARTITIONS > 0 and engine.dialect.name == 'postgresql'
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -29,3 +42,10 @@ def get_db():
 
 
 DbSession = Annotated[Session, Depends(get_db)]
+
+
+def upsert(db: Session, entity):
+    """INSERT construct supporting ON CONFLICT for the session's dialect (Postgres or SQLite)."""
+    if db.get_bind().dialect.name == 'sqlite':
+        return sqlite.insert(entity)
+    return postgresql.insert(entity)
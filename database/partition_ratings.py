@@ -0,0 +1,174 @@
+"""
+Online migration of an existing, unpartitioned ratings table to a table hash partitioned on user_id.
+
+    python -m database.partition_ratings --partitions 16
+
+Steps, each safe to re-run:
+1. prepare: create ratings_new (partitioned, with its constraints) and a trigger on ratings that mirrors
+   every insert, update and delete into it, so writes during the copy are not lost;
+2. copy: copy existing rows in id ranges of --batch-size, one short transaction per batch. Rows are read
+   FOR SHARE so a concurrent update or delete waits for the batch and is then mirrored by the trigger;
+3. swap: in one short transaction, lock ratings, drop the trigger and rename ratings_new to ratings.
+   The old table is kept as ratings_old unless --drop-old is given.
+
+Set RATINGS_PARTITIONS to the same partition count for the application.
+"""
+from sqlalchemy import text
+from database.core import engine, RATINGS_PARTITIONS
+from entities.album import ratings_partition_ddl
+import argparse
+import logging
+import time
+
+PREPARE = [
+    'CREATE TABLE ratings_new (LIKE ratings INCLUDING DEFAULTS) PARTITION BY HASH (user_id)',
+    'ALTER TABLE ratings_new ADD CONSTRAINT ratings_new_pkey PRIMARY KEY (id, user_id)',
+    'ALTER TABLE ratings_new ADD CONSTRAINT uix_user_album_new UNIQUE (user_id, album_id)',
+    'ALTER TABLE ratings_new ADD CONSTRAINT ratings_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)',
+    'ALTER TABLE ratings_new ADD CONSTRAINT ratings_album_id_fkey FOREIGN KEY (album_id) REFERENCES albums (id)',
+    'CREATE INDEX ix_ratings_new_id ON ratings_new (id)',
+]
+
+MIRROR_TRIGGER = [
+    '''
+    CREATE OR REPLACE FUNCTION ratings_mirror() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM ratings_new WHERE id = OLD.id AND user_id = OLD.user_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO ratings_new (id, user_id, album_id, created_at, rating)
+            VALUES (NEW.id, NEW.user_id, NEW.album_id, NEW.created_at, NEW.rating)
+            ON CONFLICT DO NOTHING;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS ratings_mirror ON ratings',
+    'CREATE TRIGGER ratings_mirror AFTER INSERT OR UPDATE OR DELETE ON ratings '
+    'FOR EACH ROW EXECUTE FUNCTION ratings_mirror()',
+]
+
+COPY_BATCH = text('''
+    WITH batch AS (
+        SELECT id, user_id, album_id, created_at, rating
+        FROM ratings
+        WHERE id > :low AND id <= :high
+        FOR SHARE
+    )
+    INSERT INTO ratings_new (id, user_id, album_id, created_at, rating)
+    SELECT id, user_id, album_id, created_at, rating FROM batch
+    ON CONFLICT DO NOTHING
+''')
+
+SWAP = [
+    'LOCK TABLE ratings IN ACCESS EXCLUSIVE MODE',
+    'DROP TRIGGER ratings_mirror ON ratings',
+    'DROP FUNCTION ratings_mirror()',
+    'ALTER TABLE ratings RENAME TO ratings_old',
+    'ALTER TABLE ratings_old RENAME CONSTRAINT ratings_pkey TO ratings_old_pkey',
+    'ALTER TABLE ratings_old RENAME CONSTRAINT uix_user_album TO uix_user_album_old',
+    'ALTER INDEX IF EXISTS ix_ratings_id RENAME TO ix_ratings_old_id',
+    'ALTER TABLE ratings_new RENAME TO ratings',
+    'ALTER TABLE ratings RENAME CONSTRAINT ratings_new_pkey TO ratings_pkey',
+    'ALTER TABLE ratings RENAME CONSTRAINT uix_user_album_new TO uix_user_album',
+    'ALTER INDEX ix_ratings_new_id RENAME TO ix_ratings_id',
+    # Move the id sequence over so dropping ratings_old does not drop it
+    'ALTER SEQUENCE ratings_id_seq OWNED BY ratings.id',
+]
+
+
+def table_exists(connection, name: str) -> bool:
+    return connection.execute(text('SELECT to_regclass(:name) IS NOT NULL'), {'name': name}).scalar()
+
+
+def is_partitioned(connection, name: str) -> bool:
+    return connection.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))"),
+        {'name': name}
+    ).scalar()
+
+
+def prepare(partitions: int):
+    with engine.begin() as connection:
+        if not table_exists(connection, 'ratings_new'):
+            logging.info(
+                f'Creating ratings_new with {partitions} hash partitions')
+            for statement in PREPARE + ratings_partition_ddl('ratings_new', partitions):
+                connection.execute(text(statement))
+
+        logging.info('Installing mirror trigger on ratings')
+        for statement in MIRROR_TRIGGER:
+            connection.execute(text(statement))
+
+
+def copy(batch_size: int, start_after: int, pause_seconds: float):
+    # Rows above max_id are inserted after the trigger exists and are mirrored by it
+    with engine.connect() as connection:
+        max_id = connection.execute(
+            text('SELECT coalesce(max(id), 0) FROM ratings')).scalar()
+
+    low = start_after
+    while low < max_id:
+        high = min(low + batch_size, max_id)
+        with engine.begin() as connection:
+            copied = connection.execute(
+                COPY_BATCH, {'low': low, 'high': high}).rowcount
+        logging.info(f'Copied ids ({low}, {high}]: {copied} rows')
+        low = high
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+
+def swap(drop_old: bool):
+    with engine.begin() as connection:
+        for statement in SWAP:
+            connection.execute(text(statement))
+        for name in connection.execute(
+            text("SELECT relname FROM pg_class WHERE relname LIKE 'ratings\\_new\\_p%' AND relkind = 'r'")
+        ).scalars().all():
+            connection.execute(
+                text(f'ALTER TABLE {name} RENAME TO {name.replace("ratings_new_", "ratings_", 1)}'))
+    logging.info('ratings is now partitioned; the previous table is ratings_old')
+
+    if drop_old:
+        with engine.begin() as connection:
+            connection.execute(text('DROP TABLE ratings_old'))
+        logging.info('Dropped ratings_old')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Move the ratings table to hash partitions on user_id without downtime')
+    parser.add_argument('--partitions', type=int, default=RATINGS_PARTITIONS,
+                        help='number of hash partitions (defaults to RATINGS_PARTITIONS)')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='ids copied per transaction')
+    parser.add_argument('--start-after', type=int, default=0,
+                        help='resume the copy after this id')
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help='seconds to sleep between batches')
+    parser.add_argument('--drop-old', action='store_true',
+                        help='drop the old table after the swap')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if engine.dialect.name != 'postgresql':
+        parser.error('partitioning requires PostgreSQL')
+    if args.partitions < 1:
+        parser.error('--partitions (or RATINGS_PARTITIONS) must be at least 1')
+
+    with engine.connect() as connection:
+        if is_partitioned(connection, 'ratings'):
+            logging.info('ratings is already partitioned, nothing to do')
+            return
+
+    prepare(args.partitions)
+    copy(args.batch_size, args.start_after, args.pause)
+    swap(args.drop_old)
+
+
+if __name__ == '__main__':
+    main()
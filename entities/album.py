@@ -1,15 +1,18 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, UniqueConstraint, DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
-from database.core import Base
+from database.core import Base, RATINGS_PARTITIONS, RATINGS_PARTITIONED
+from entities.genre import album_genres
 
 
 class Rating(Base):
     __tablename__ = 'ratings'
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # When hash partitioned on user_id, the primary key must include the partition key
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False,
+                     primary_key=RATINGS_PARTITIONED)
     album_id = Column(Integer, ForeignKey('albums.id'), nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     rating = Column(Integer, nullable=False)  # Rating out of 5
@@ -18,10 +21,26 @@ class Rating(Base):
     album = relationship("Album", back_populates="ratings")
 
     __table_args__ = (
+        # Includes user_id, so each partition enforces it locally
         UniqueConstraint('user_id', 'album_id', name='uix_user_album'),
+        {'postgresql_partition_by': 'HASH (user_id)'} if RATINGS_PARTITIONED else {},
     )
 
 
+def ratings_partition_ddl(parent: str, partitions: int) -> list[str]:
+    ''' CREATE TABLE statements for the hash partitions of a ratings table '''
+    return [
+        f'CREATE TABLE {parent}_p{remainder} PARTITION OF {parent} '
+        f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})'
+        for remainder in range(partitions)
+    ]
+
+
+if RATINGS_PARTITIONED:
+    for statement in ratings_partition_ddl('ratings', RATINGS_PARTITIONS):
+        event.listen(Rating.__table__, 'after_create', DDL(statement))
+
+
 class Album(Base):
     __tablename__ = 'albums'
 
@@ -33,6 +52,8 @@ class Album(Base):
     image_url = Column(String, nullable=True)  # URL or path to the cover image
 
     ratings = relationship("Rating", back_populates="album")
+    genres = relationship("Genre", secondary=album_genres,
+                          back_populates="albums")
 
     __table_args__ = (
         UniqueConstraint('title', 'artist', name='uix_album'),
@@ -40,3 +61,16 @@ class Album(Base):
 
     def __repr__(self):
         return f"<AlbumInfo(id={self.id}, title='{self.title}', artist='{self.artist}')>"
+
+
+class AlbumCover(Base):
+    __tablename__ = 'album_covers'
+
+    album_id = Column(Integer, ForeignKey('albums.id'), primary_key=True)
+    sha256 = Column(String(64), nullable=False)  # key into the local cover store
+    content_type = Column(String, nullable=False)  # of the original image
+    source_url = Column(String, nullable=False)
+    fetched_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<AlbumCover(album_id={self.album_id}, sha256='{self.sha256}')>"
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime, timezone
+
+from database.core import Base
+
+
+class FeedEntry(Base):
+    __tablename__ = 'feed_events'
+
+    # Shared by all workers, so it doubles as the feed cursor
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    # Album details are copied so events can be read without joins and outlive their ratings
+    album_id = Column(Integer, nullable=True)
+    title = Column(String, nullable=True)
+    artist = Column(String, nullable=True)
+    image_url = Column(String, nullable=True)
+    rating = Column(Integer, nullable=True)
+    occurred_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    # Never reuse ids on SQLite, or a cursor could skip new events
+    __table_args__ = ({'sqlite_autoincrement': True},)
+
+    def __repr__(self):
+        return f"<FeedEntry(id={self.id}, kind='{self.kind}', user_id={self.user_id})>"
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, Index
+from sqlalchemy.orm import relationship
+
+from database.core import Base
+
+
+# Association between albums and their normalized genres
+album_genres = Table(
+    'album_genres',
+    Base.metadata,
+    Column('album_id', Integer, ForeignKey('albums.id'), primary_key=True),
+    Column('genre_id', Integer, ForeignKey('genres.id'), primary_key=True),
+    Index('ix_album_genres_genre_id', 'genre_id', 'album_id'),
+)
+
+
+class Genre(Base):
+    __tablename__ = 'genres'
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+
+    albums = relationship("Album", secondary=album_genres,
+                          back_populates="genres")
+
+    def __repr__(self):
+        return f"<Genre(id={self.id}, name='{self.name}')>"
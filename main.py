@@ -4,7 +4,8 @@ from sqlalchemy.orm import Session
 from auth import controller as auth
 from users import controller as users
 from album import controller as album
-from database.core import get_db, Base, engine
+from database.core import get_db, Base, engine, SessionLocal
+from album import feed
 from fastapi import status
 from app_logging import configure_logging
 import logging
@@ -19,6 +20,11 @@ app.include_router(album.router)
 # Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
 
+# Seed this worker's recent-activity feed from the database, then follow events from all workers
+with SessionLocal() as session:
+    feed.poller.backfill(session)
+feed.poller.start()
+
 db_session = Annotated[Session, Depends(get_db)]
 
 
@@ -15,3 +15,9 @@ RATING_ALREADY_EXISTS = "Rating already exists for this album by the user"
 ALBUM_CREATION_FAILED = "Failed to create album"
 ALBUM_ALREADY_EXISTS = "Album already exists"
 ALBUM_NOT_FOUND = "Album not found"
+COVER_NOT_FOUND = "Cover art not found"
+COVER_SIZE_INVALID = "Unknown cover size"
+ALBUM_RESOLVE_BATCH_TOO_LARGE = "Too many albums in a single resolve request"
+
+# External services
+DISCOGS_UNAVAILABLE = "Album search is temporarily unavailable, please try again later"
@@ -19,3 +19,9 @@ router = APIRouter(
 @limiter.limit("5/minute")
 async def change_password(request: Request, password_change: model.PasswordChange, db: DbSession, current_user: CurrentUser):
     service.change_password(password_change, db, current_user)
+
+
+@router.get('/profile/stats', response_model=model.ProfileStatsResponse)
+@limiter.limit("10/minute")
+def get_profile_stats(request: Request, db: DbSession, current_user: CurrentUser):
+    return service.get_profile_stats(db, current_user)
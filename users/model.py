@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
 
@@ -14,3 +15,23 @@ class PasswordChange(BaseModel):
     old_password: str
     new_password: str
     new_password_confirmation: str
+
+
+class GenreStats(BaseModel):
+    genre: str
+    count: int
+    average: float
+
+
+class PeriodStats(BaseModel):
+    period: str  # YYYY-MM
+    count: int
+    average: float
+
+
+class ProfileStatsResponse(BaseModel):
+    total: int
+    average: Optional[float] = None
+    histogram: Dict[int, int]  # rating value -> number of ratings
+    genres: List[GenreStats]
+    over_time: List[PeriodStats]
@@ -2,10 +2,28 @@ from auth.service import CurrentUser
 from . import model
 from sqlalchemy.orm import Session
 from entities.user import User
+from entities.album import Rating
+from entities.genre import Genre, album_genres
 from auth.service import verify_password, get_password_hash
 from fastapi import HTTPException, status
 from utils.current_user_utils import get_current_db_user
+from sqlalchemy import func, select, literal, literal_column, cast, union_all, String
+from threading import Lock
 import logging
+import time
+import dotenv
+import os
+
+dotenv.load_dotenv()
+# Safety net for other workers' caches, which are not invalidated by a mutation handled elsewhere
+PROFILE_STATS_CACHE_SECONDS = float(
+    os.getenv("PROFILE_STATS_CACHE_SECONDS", "300"))
+
+# user_id -> (computed_at, stats), dropped on the user's next rating mutation
+_profile_stats_cache: dict[int, tuple[float, model.ProfileStatsResponse]] = {}
+# user_id -> number of invalidations, so a computation that raced a mutation is not cached
+_profile_stats_versions: dict[int, int] = {}
+_profile_stats_lock = Lock()
 
 
 def check_password(password: str, hashed_password: str) -> bool:
@@ -38,3 +56,82 @@ def change_password(password_change: model.PasswordChange, db: Session, current_
     logging.info(f'User: {user_id} password was changed successfully')
     db_user.hashed_password = get_password_hash(password_change.new_password)
     db.commit()
+
+
+def invalidate_profile_stats(user_id: int):
+    '''
+    Drops the cached profile stats of a user, called after any change to their ratings
+    '''
+    with _profile_stats_lock:
+        _profile_stats_versions[user_id] = _profile_stats_versions.get(user_id, 0) + 1
+        _profile_stats_cache.pop(user_id, None)
+
+
+def _rating_month(db: Session):
+    # Formats are inlined so the SELECT and GROUP BY expressions compare equal
+    if db.get_bind().dialect.name == 'sqlite':
+        return func.strftime(literal_column("'%Y-%m'"), Rating.created_at)
+    return func.to_char(Rating.created_at, literal_column("'YYYY-MM'"))
+
+
+def get_profile_stats(db: Session, current_user: CurrentUser) -> model.ProfileStatsResponse:
+    '''
+    Returns the current user's rating histogram, per genre counts and averages and ratings per month
+    '''
+    user_id = current_user.user_id
+
+    with _profile_stats_lock:
+        cached = _profile_stats_cache.get(user_id)
+        version = _profile_stats_versions.get(user_id, 0)
+    if cached and time.monotonic() - cached[0] < PROFILE_STATS_CACHE_SECONDS:
+        return cached[1]
+
+    month = _rating_month(db)
+    # All three aggregates in one round trip, tagged by kind
+    stmt = union_all(
+        select(literal('rating').label('kind'), cast(Rating.rating, String).label('bucket'),
+               func.count().label('count'), func.avg(Rating.rating).label('average'))
+        .where(Rating.user_id == user_id)
+        .group_by(Rating.rating),
+        select(literal('genre'), Genre.name,
+               func.count(), func.avg(Rating.rating))
+        .join(album_genres, album_genres.c.album_id == Rating.album_id)
+        .join(Genre, Genre.id == album_genres.c.genre_id)
+        .where(Rating.user_id == user_id)
+        .group_by(Genre.name),
+        select(literal('month'), month,
+               func.count(), func.avg(Rating.rating))
+        .where(Rating.user_id == user_id)
+        .group_by(month),
+    )
+    rows = db.execute(stmt).all()
+
+    histogram = {value: 0 for value in range(6)}
+    genres = []
+    over_time = []
+    for kind, bucket, count, average in rows:
+        if kind == 'rating':
+            histogram[int(bucket)] = count
+        elif kind == 'genre':
+            genres.append(model.GenreStats(
+                genre=bucket, count=count, average=round(float(average), 2)))
+        else:
+            over_time.append(model.PeriodStats(
+                period=bucket, count=count, average=round(float(average), 2)))
+
+    total = sum(histogram.values())
+    stats = model.ProfileStatsResponse(
+        total=total,
+        average=round(sum(value * count for value, count in histogram.items()) / total, 2) if total else None,
+        histogram=histogram,
+        genres=sorted(genres, key=lambda g: (-g.count, g.genre)),
+        over_time=sorted(over_time, key=lambda p: p.period)
+    )
+
+    with _profile_stats_lock:
+        # A mutation committed while we were reading may not be in these numbers
+        if _profile_stats_versions.get(user_id, 0) == version:
+            _profile_stats_cache[user_id] = (time.monotonic(), stats)
+
+    logging.info(f'Computed profile stats for user: {user_id}')
+    return stats